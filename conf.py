@@ -1,6 +1,14 @@
 import numpy
 
 ARG_FPS = "--fps"
+ARG_OUTPUTS = "--outputs"
+ARG_PREVIEW_EVERY = "--preview-every"
+ARG_PREVIEW_SCALE = "--preview-scale"
+ARG_NO_PREVIEW = "--no-preview"
+ARG_BATCH = "--batch"
+ARG_PASSES = "--passes"
+ARG_CONTROL_SOCKET = "--control-socket"
+ARG_NO_CONTROL = "--no-control"
 
 OUT_WIDTH = 1280
 OUT_HEIGHT = 720
@@ -8,6 +16,44 @@ OUT_HEIGHT = 720
 # Target frame per seconds (not guaranteed).
 OUT_FPS = 60
 
+# Control window preview: every n-th output frame is shown, resized by scale.
+PREVIEW_EVERY_NTH_FRAME = 4
+PREVIEW_SCALE = 0.5
+
+# Unix domain socket of the control API.
+CONTROL_SOCKET_PATH = "/tmp/pooce.sock"
+
+# Max size of the rasterized text lines kept by the text engine (bytes).
+TEXT_CACHE_MAX_BYTES = 32 << 20
+
+# Max number of lines kept by the text passes (typing, shell output).
+TEXT_BUFFER_MAX_LINES = 200
+# Rows scrolled by one scroll key press.
+TEXT_SCROLL_STEP = 3
+
+# Threads running the (parallel) pass updates.
+PASS_GRAPH_WORKERS = 4
+
+# Decoded model data cached between runs.
+CACHE_DIR = ".cache"
+
+# Simulation step of the animated passes (their speeds are tuned per step) in seconds.
+SIMULATION_STEP = 1.0 / 60
+# Max time a frame can advance the animations (after stalls).
+FRAME_CLOCK_MAX_DT = 0.25
+
+# Dot drawer caps: max number of dots kept and the eviction policy when full.
+EVICT_OLDEST = 1
+EVICT_RESET = 2
+DOT_DRAWER_MAX_POINTS = 10000
+DOT_DRAWER_EVICTION = EVICT_OLDEST
+
+# Interval of the memory accounting report (log and HUD) in seconds.
+MEMORY_REPORT_INTERVAL = 30
+
+# Frames per batch in offline processing.
+OFFLINE_BATCH_SIZE = 16
+
 # Linux device numbers (/dev/video?).
 IN_VIDEO_DEVICE_ID = 0
 OUT_VIDEO_DEVICE_ID = 2
@@ -21,12 +67,18 @@ COLOR_RED = (0, 0, 255)
 COLOR_LAGUNA_BLUE = (255, 255, 0)
 COLOR_MAGENTA = (255, 0, 255)
 COLOR_ORANGE = (0, 150, 255)
+COLOR_YELLOW = (0, 255, 255)
 
 # For main event handling.
 EVENT_MOUSE_LEFT_DOWN = 1
 EVENT_MOUSE_LEFT_UP = 2
 EVENT_MOUSE_MIDDLE_DOWN = 3
 
+# Event kinds (for indexing events per frame).
+EVENT_KIND_KEY = 1
+EVENT_KIND_MOUSE_CLICK = 2
+EVENT_KIND_MOUSE_MOVE = 3
+
 # Mask to control which output renderer is enabled.
 OUTPUT_RENDER_PASS_MASK_ALL = ~0
 OUTPUT_RENDER_PASS_MASK_NONE = 1  # Have the demo logo shown.
@@ -0,0 +1,85 @@
+import asyncio
+import collections
+import json
+import logging
+import os
+import stat
+import threading
+
+from conf import *
+
+
+#
+# Local control API on a unix domain socket. Clients send one JSON command per line (eg `{"cmd": "enable",
+# "pass": 11}`) and get one JSON reply per line. The server runs an asyncio loop in its own thread, commands are
+# only queued there. The render loop applies all queued commands between two frames (`apply`), so a frame never
+# sees a half applied change and the render loop never waits on a client.
+#
+class ControlServer:
+    def __init__(self, path=CONTROL_SOCKET_PATH):
+        self.path = path
+        # Items are (command, reply future, loop of the future).
+        self.commands = collections.deque()
+        threading.Thread(target=self.server_thread, daemon=True).start()
+
+    def server_thread(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception:
+            logging.exception("Control server failed")
+
+    async def serve(self):
+        # Leftover of a previous run.
+        if os.path.exists(self.path) and stat.S_ISSOCK(os.stat(self.path).st_mode):
+            os.unlink(self.path)
+
+        server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        os.chmod(self.path, 0o600)
+        logging.info("Control server listening on " + self.path)
+
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if len(line) == 0:
+                    break
+
+                try:
+                    command = json.loads(line)
+                    if not isinstance(command, dict):
+                        raise ValueError("Command must be an object")
+                except ValueError as e:
+                    reply = {"ok": False, "error": "Invalid command: " + str(e)}
+                else:
+                    future = loop.create_future()
+                    self.commands.append((command, future, loop))
+                    reply = await future
+
+                writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # Called from the render loop between frames: applies the queued commands with the handler (command -> reply).
+    def apply(self, handler):
+        for _ in range(len(self.commands)):
+            command, future, loop = self.commands.popleft()
+
+            try:
+                reply = handler(command)
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+
+            loop.call_soon_threadsafe(self.resolve, future, reply)
+
+    def resolve(self, future, reply):
+        # The client may have gone away meanwhile.
+        if not future.done():
+            future.set_result(reply)
@@ -0,0 +1,204 @@
+import cv2
+import numpy
+import threading
+import time
+
+from conf import *
+
+#
+# Producers of derived images. Each gets the input frame, the frame context (for the images it's derived from)
+# and the buffer it returned on the previous frame (None at first) to write into, so steady state conversions
+# don't allocate.
+#
+
+
+def derive_gray(img, ctx, out):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=out)
+
+
+def derive_hsv(img, ctx, out):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2HSV, dst=out)
+
+
+def derive_half(img, ctx, out):
+    return cv2.resize(
+        img,
+        (img.shape[1] >> 1, img.shape[0] >> 1),
+        dst=out,
+        interpolation=cv2.INTER_AREA,
+    )
+
+
+def derive_half_gray(img, ctx, out):
+    return cv2.cvtColor(ctx["half"], cv2.COLOR_BGR2GRAY, dst=out)
+
+
+def derive_quarter(img, ctx, out):
+    half = ctx["half"]
+    return cv2.resize(
+        half,
+        (half.shape[1] >> 1, half.shape[0] >> 1),
+        dst=out,
+        interpolation=cv2.INTER_AREA,
+    )
+
+
+def derive_ssd_300(img, ctx, out):
+    return cv2.resize(img, (300, 300), dst=out)
+
+
+# Same as `cv2.dnn.blobFromImage(img, 0.007843, (300, 300), 127.5)`, written into the previous blob.
+def derive_ssd_blob(img, ctx, out):
+    if out is None:
+        out = numpy.empty((1, 3, 300, 300), numpy.float32)
+
+    numpy.copyto(out[0], ctx["ssd_300"].transpose(2, 0, 1))
+    # OpenCV takes a scalar mean as (mean, 0, 0), only the first channel is shifted.
+    out[0, 0] -= 127.5
+    out *= 0.007843
+
+    return out
+
+
+#
+# Derived representations of the input frame that passes can ask for (`OutputRenderPass.requires`):
+# name -> (names it's derived from, producer).
+#
+DERIVED_IMAGES = {
+    "gray": ((), derive_gray),
+    "hsv": ((), derive_hsv),
+    # Downscaled pyramid.
+    "half": ((), derive_half),
+    "half_gray": (("half",), derive_half_gray),
+    "quarter": (("half",), derive_quarter),
+    # MobileNet SSD input.
+    "ssd_300": ((), derive_ssd_300),
+    "ssd_blob": (("ssd_300",), derive_ssd_blob),
+}
+
+
+#
+# Pixel wise conversions, for a batch of frames these are computed in a single call on the stacked frames.
+#
+BATCH_DERIVED_IMAGES = {
+    "gray": cv2.COLOR_BGR2GRAY,
+    "hsv": cv2.COLOR_BGR2HSV,
+}
+
+
+#
+# Computes the batchable derived images of a batch of frames (stacked, N x H x W x 3) into their contexts.
+#
+def derive_batch(contexts, frames, names):
+    count, height, width = frames.shape[:3]
+
+    for name in names:
+        if name not in BATCH_DERIVED_IMAGES:
+            continue
+
+        converted = cv2.cvtColor(
+            frames.reshape(count * height, width, 3), BATCH_DERIVED_IMAGES[name]
+        )
+        converted = converted.reshape((count, height) + converted.shape[1:])
+
+        for ctx, image in zip(contexts, converted):
+            ctx[name] = image
+
+
+#
+# Monotonic clock of the frames: time of the current frame and the time passed since the previous one. Animated
+# passes advance by `dt` (not per frame), so their speed doesn't depend on the frame rate. Long stalls are capped
+# at `max_dt` to avoid a burst of catch up work.
+#
+class FrameClock:
+    def __init__(self, max_dt=FRAME_CLOCK_MAX_DT):
+        self.max_dt = max_dt
+        self.now = None
+        self.dt = 0.0
+
+    def tick(self, now=None, dt=None):
+        if now is None:
+            now = time.monotonic()
+
+        if dt is None:
+            dt = 0.0 if self.now is None else now - self.now
+
+        self.dt = min(max(dt, 0.0), self.max_dt)
+        self.now = now
+
+
+#
+# Fixed timestep accumulator for simulations: turns the variable frame time into a whole number of simulation
+# steps. The leftover time, as a fraction of a step (`alpha`), interpolates between the last two states.
+#
+class FixedTimestep:
+    def __init__(self, step=SIMULATION_STEP):
+        self.step = step
+        self.accumulator = 0.0
+
+    def advance(self, dt):
+        self.accumulator += dt
+        steps = int(self.accumulator / self.step)
+        self.accumulator -= steps * self.step
+
+        return steps
+
+    def alpha(self):
+        return self.accumulator / self.step
+
+
+#
+# Per frame context passed to the passes alongside the frame. Derived images (see `DERIVED_IMAGES`) are computed
+# lazily on first access and memoized for the frame.
+# The frame clock is ticked on every reset, with the current time unless a timestamp (and time step) is given, eg
+# when processing a recording.
+#
+# The context is reset and reused for every frame: derived images are written into the buffers of the previous
+# frame, so passes must not hold on to them across frames.
+#
+class FrameContext:
+    def __init__(self, img=None):
+        # Derivation may happen from parallel pass updates.
+        self.lock = threading.RLock()
+        self.buffers = {}
+        self.clock = FrameClock()
+        self.reset(img)
+
+    def reset(self, img, now=None, dt=None):
+        self.img = img
+        self.values = {}
+        self.clock.tick(now, dt)
+
+    def prepare(self, names):
+        for name in names:
+            self[name]
+
+    def __getitem__(self, name):
+        if name in self.values:
+            return self.values[name]
+
+        if name not in DERIVED_IMAGES:
+            raise KeyError(name)
+
+        with self.lock:
+            if name not in self.values:
+                sources, producer = DERIVED_IMAGES[name]
+                self.prepare(sources)
+
+                value = producer(self.img, self, self.buffers.get(name))
+                self.buffers[name] = value
+                self.values[name] = value
+
+        return self.values[name]
+
+    def __setitem__(self, name, value):
+        self.values[name] = value
+
+    def __contains__(self, name):
+        return name in self.values
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+    def retained_bytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
@@ -5,7 +5,7 @@ Pooce is an artificial video output stream that allows interaction (plugins).
 It works in a very simple way: it opens a video device and puts a renderable frame onto the output. This frame
 is a copy of the default available video device (existing webcam).
 The output is handed over to a list of programmable passes (output render passes) before the
-final return.
+final return. One pipeline can feed several output devices, each with its own passes, size and frame rate.
 
 Currently only supported on Linux.
 """
@@ -16,24 +16,15 @@ import select
 import sys
 import numpy
 import threading
-import queue
 import time
 import signal
 import logging
 
 from conf import *
+from profiler import *
 from shared import *
-from plugins.pong import PongRenderPass
-from plugins.rain import RandomFlashRenderPass
-from plugins.static_text import StaticTextRenderPass
-from plugins.shell_watch import ShellWatcherRenderPass
-from plugins.typing_text import TypingTextRenderPass
-from plugins.shape_detection import CarDrawRenderPass
-from plugins.dot_detection import RedDotDrawRenderPass
-from plugins.template_detection import TemplateRecognitionDrawRenderPass
-from plugins.mouse_drawing import MouseDrawRenderPass
-from plugins.morse_code import MorseCodeRenderPass
-from plugins.timer import TimerRenderPass
+from pipeline import *
+from control_server import *
 
 logging.basicConfig()
 logging.root.setLevel(logging.NOTSET)
@@ -53,12 +44,24 @@ def sig_interrupt_handler(sig, frame):
 
 
 #
-# App level control window for event collection (mouse and keyboard).
+# App level control window for event collection (mouse and keyboard). It also previews the output: a downscaled
+# copy of every n-th frame. With the preview disabled (headless) the window is only kept for the events.
 #
 class ControlWindow:
-    def __init__(self, event_queue: queue.Queue):
+    def __init__(
+        self,
+        event_bus: EventBus,
+        preview_slot: FrameSlot,
+        preview_enabled=True,
+        preview_every=PREVIEW_EVERY_NTH_FRAME,
+        preview_scale=PREVIEW_SCALE,
+    ):
         self.window_name = "pooce-mouse"
-        self.event_queue = event_queue
+        self.event_bus = event_bus
+        self.preview_slot = preview_slot
+        self.preview_enabled = preview_enabled
+        self.preview_every = max(1, preview_every)
+        self.preview_scale = preview_scale
         threading.Thread(target=self.window_thread).start()
 
     def window_thread(self):
@@ -68,105 +71,195 @@ class ControlWindow:
         cv2.namedWindow(self.window_name)
         cv2.setMouseCallback(self.window_name, self.on_mouse_event)
 
+        # The window needs some content to receive events, until (or instead of) the first preview.
+        cv2.imshow(self.window_name, self.downscale(background))
+
+        last_preview_seq = -self.preview_every
         while not global_exit_flag:
-            cv2.imshow(self.window_name, background)
+            if self.preview_enabled:
+                seq, frame = self.preview_slot.get()
+                if frame is not None and seq - last_preview_seq >= self.preview_every:
+                    last_preview_seq = seq
+                    cv2.imshow(self.window_name, self.downscale(frame))
+
             key_code = cv2.waitKey(20) & 0xFF
 
             if key_code == 27:
                 break
 
             if key_code > 0:
-                self.event_queue.put(Event(key_code=key_code))
+                self.event_bus.push(Event(key_code=key_code))
 
         cv2.destroyAllWindows()
 
+    # Preview of a frame, scaled relative to the pipeline resolution (whatever the resolution of the output is), so
+    # mouse positions map back with the preview scale alone. It's mirrored, like the camera view the passes map the
+    # mouse for (and their text is drawn for).
+    def downscale(self, img):
+        size = (
+            int(OUT_WIDTH * self.preview_scale),
+            int(OUT_HEIGHT * self.preview_scale),
+        )
+        if (img.shape[1], img.shape[0]) != size:
+            img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+        return cv2.flip(img, 1)
+
     def on_mouse_event(self, event, x, y, flags, param):
         if event == cv2.EVENT_LBUTTONDOWN:
-            self.event_queue.put(Event(mouse_click=EVENT_MOUSE_LEFT_DOWN))
+            self.event_bus.push(Event(mouse_click=EVENT_MOUSE_LEFT_DOWN))
         elif event == cv2.EVENT_LBUTTONUP:
-            self.event_queue.put(Event(mouse_click=EVENT_MOUSE_LEFT_UP))
+            self.event_bus.push(Event(mouse_click=EVENT_MOUSE_LEFT_UP))
         elif event == cv2.EVENT_MBUTTONDOWN:
-            self.event_queue.put(Event(mouse_click=EVENT_MOUSE_MIDDLE_DOWN))
+            self.event_bus.push(Event(mouse_click=EVENT_MOUSE_MIDDLE_DOWN))
 
-        self.event_queue.put(Event(mouse_pos=(x, y)))
+        # Map back from preview to output coordinates.
+        self.event_bus.push(
+            Event(mouse_pos=(int(x / self.preview_scale), int(y / self.preview_scale)))
+        )
 
 
 #
-# Environment config collecting all env and command line args used in the app.
+# Sink feeding one output device with the latest frame of its pipeline output slot. Runs in the device's own
+# thread, paced by the device frame rate: frames are repeated when the pipeline is slower, dropped when faster.
+# Until the pipeline produces its first frame (startup) a placeholder is shown.
 #
-class EnvConfig:
-    def __init__(self):
-        self.raw_args = sys.argv
-        self.value_args = {}
-        self.flags = []
-
-        for raw_arg in self.raw_args:
-            if raw_arg.find("=") > 0:
-                parts = raw_arg.split("=")
-                self.value_args[parts[0]] = parts[1]
-            else:
-                self.flags.append(raw_arg)
+class OutputSource(virtualvideo.VideoSource):
+    def __init__(self, output: OutputSpec, slot: FrameSlot):
+        self.output = output
+        self.slot = slot
+
+        self.placeholder = numpy.zeros((output.height, output.width, 3), numpy.uint8)
+        draw_text(
+            self.placeholder,
+            "Starting...",
+            (16, output.height - 16),
+            color=COLOR_WHITE,
+            mirrored=True,
+        )
+
+    def img_size(self):
+        return (self.output.width, self.output.height)
 
+    def fps(self):
+        return self.output.fps
+
+    def generator(self):
+        global global_exit_flag
+
+        profiler.mark("first output frame /dev/video" + str(self.output.device_id))
+
+        while not global_exit_flag:
+            _, img = self.slot.get()
+            yield self.placeholder if img is None else img
 
+
+#
+# Video proxy that reads the default video device and executes a list of render passes to augment it. The
+# result is fanned out to one or more artificial video devices.
 #
-# Video proxy that sets up an artificial video device and executes a list of render passes to augment it.
+# Startup is staged: the output devices start right away (with a placeholder), the camera and the heavy pass
+# resources (models) load in the background.
 #
-class VideoProxy(virtualvideo.VideoSource):
-    def __init__(self, config, fps):
+class VideoProxy:
+    def __init__(self, config, outputs):
         logging.info("Video Proxy start")
 
-        self.event_queue = queue.Queue()
+        self.event_bus = EventBus()
         self.config = config
 
-        self.fps_value = fps
         self.width = OUT_WIDTH
         self.height = OUT_HEIGHT
 
-        self.output_rect = (self.width, self.height)
-
-        self.videoInputOriginal = cv2.VideoCapture(IN_VIDEO_DEVICE_ID)
-
-        self.output_render_passes = [
-            StaticTextRenderPass("Video Proxy Demo v0.1"),
-            RandomFlashRenderPass(),
-            TypingTextRenderPass(),
-            MorseCodeRenderPass(),
-            PongRenderPass(),
-            ShellWatcherRenderPass(["vmstat"], 10, 8),
-            ShellWatcherRenderPass(["cat", "experiment/notepad.txt"], 10, 300, 30),
-            MouseDrawRenderPass(),
-            TimerRenderPass(),
-            TemplateRecognitionDrawRenderPass(),
-            RedDotDrawRenderPass(LineDrawer()),
-            CarDrawRenderPass(),
-        ]
-        for i, render_pass in enumerate(self.output_render_passes):
+        self.pipeline = Pipeline(default_render_passes(), outputs)
+        for i, render_pass in enumerate(self.pipeline.render_passes):
             logging.info("Pass #" + str(i) + ": " + render_pass.name())
 
-        # To keep window thread alive.
-        self.__control_window = ControlWindow(self.event_queue)
+        self.output_devices = []
+        for i, output in enumerate(outputs):
+            logging.info("Output #" + str(i) + ": " + str(output))
+
+            video_device = virtualvideo.FakeVideoDevice()
+            video_device.init_input(OutputSource(output, self.pipeline.output_slots[i]))
+            video_device.init_output(
+                output.device_id, output.width, output.height, output.fps
+            )
+            self.output_devices.append(video_device)
+
+        self.videoInputOriginal = BackgroundResource("camera", self.open_camera)
+
+        self.control_server = None
+        if ARG_NO_CONTROL not in config.flags:
+            self.control_server = ControlServer(
+                config.value_args.get(ARG_CONTROL_SOCKET) or CONTROL_SOCKET_PATH
+            )
+
+        # To keep window thread alive. The preview shows the first output.
+        self.__control_window = ControlWindow(
+            self.event_bus,
+            self.pipeline.output_slots[0],
+            preview_enabled=ARG_NO_PREVIEW not in config.flags,
+            preview_every=int(
+                config.value_args.get(ARG_PREVIEW_EVERY) or PREVIEW_EVERY_NTH_FRAME
+            ),
+            preview_scale=float(
+                config.value_args.get(ARG_PREVIEW_SCALE) or PREVIEW_SCALE
+            ),
+        )
+
+    def open_camera(self):
+        camera = cv2.VideoCapture(IN_VIDEO_DEVICE_ID)
+        if not camera.isOpened():
+            raise IOError("Cannot open video device " + str(IN_VIDEO_DEVICE_ID))
+
+        return camera
+
+    # Runs a sink until exit. A sink failing (device or ffmpeg error) stops the app.
+    def run_output_device(self, video_device):
+        global global_exit_flag
 
-    def img_size(self):
-        return self.output_rect
+        try:
+            video_device.run()
+        except Exception:
+            if not global_exit_flag:
+                logging.exception("Output device failed")
+        else:
+            if not global_exit_flag:
+                logging.error("Output device stopped")
 
-    def fps(self):
-        return self.fps_value
+        global_exit_flag = True
 
-    def generator(self):
+    def run(self):
         global global_exit_flag
         global background
 
-        output_render_pass_mask = 1
+        # Every sink is written from its own thread.
+        for video_device in self.output_devices:
+            threading.Thread(
+                target=self.run_output_device, args=(video_device,), daemon=True
+            ).start()
+
+        while not global_exit_flag and not self.videoInputOriginal.wait(0.1):
+            pass
+
+        if self.videoInputOriginal.failed:
+            global_exit_flag = True
+
+        camera = self.videoInputOriginal.get()
         is_pip_mode = False
 
         while not global_exit_flag:
             # Read the system default (0) video stream frame.
-            rval, default_video = self.videoInputOriginal.read()
+            rval, default_video = camera.read()
             if not rval:
                 logging.error("Failed retrieving default video stream frame")
                 global_exit_flag = True
                 break
 
+            # Over the frame rate cap the frame is dropped, events wait for the next one.
+            if not self.pipeline.frame_due(time.monotonic()):
+                continue
+
             # In PIP mode the default video is presented small in the top right corner.
             if is_pip_mode:
                 default_video_resized = cv2.resize(
@@ -179,58 +272,52 @@ class VideoProxy(virtualvideo.VideoSource):
             else:
                 img = cv2.resize(default_video, (self.width, self.height))
 
-            # Move out accumulated UI events from the thread safe queue.
-            events = []
-            while self.event_queue.qsize() > 0:
-                event = self.event_queue.get()
-                events.append(event)
+            # Swap out UI events accumulated since the last frame.
+            events = self.event_bus.swap()
 
-                # React on main app events (if there is any).
+            # React on main app events (if there is any).
+            for event in events.keys:
                 key_code = event.key_code
-                if key_code is not None and key_code > 0:
+                if key_code > 0:
                     if key_code == 45:  # Key: -
-                        output_render_pass_mask = OUTPUT_RENDER_PASS_MASK_ALL
+                        self.pipeline.output_render_pass_mask = (
+                            OUTPUT_RENDER_PASS_MASK_ALL
+                        )
                     elif key_code == 96:  # Key: `
-                        output_render_pass_mask = OUTPUT_RENDER_PASS_MASK_NONE
+                        self.pipeline.output_render_pass_mask = (
+                            OUTPUT_RENDER_PASS_MASK_NONE
+                        )
                     elif key_code >= 48 and key_code <= 57:  # Key: 0..9
-                        output_render_pass_mask ^= 1 << (key_code - 48)
+                        self.pipeline.output_render_pass_mask ^= 1 << (key_code - 48)
                     elif key_code == 112:  # Key: p
                         is_pip_mode = not is_pip_mode
+                    elif key_code == 109:  # Key: m
+                        self.pipeline.toggle_memory_hud()
 
-            # Execute render passes.
-            used_passes = []
-            for i, output_render_pass in enumerate(self.output_render_passes):
-                pass_mask = 1 << i
-                if output_render_pass_mask & pass_mask > 0:
-                    img = output_render_pass.render(img, events)
-                    used_passes.append(output_render_pass.name())
-
-            # Printing active passes on the screen.
-            img = cv2.flip(img, 1)
-            for i, pass_name in enumerate(used_passes):
-                cv2.putText(
-                    img,
-                    pass_name,
-                    (self.width - 250, self.height - 20 - (i * 20)),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    COLOR_WHITE,
-                    2,
-                )
-            img = cv2.flip(img, 1)
+            # Apply control API commands arrived since the last frame.
+            if self.control_server is not None:
+                self.control_server.apply(self.pipeline.control)
+
+            # Execute render passes and hand the frames over to the outputs.
+            self.pipeline.process(img, events)
+            profiler.mark("first frame")
 
-            # Present frame to the fake device.
-            yield img
+        for video_device in self.output_devices:
+            video_device.stop()
 
 
 # CTRL-C handler.
 signal.signal(signal.SIGINT, sig_interrupt_handler)
 
 config = EnvConfig()
-fps = config.value_args.get(ARG_FPS) or OUT_FPS
+fps = int(config.value_args.get(ARG_FPS) or OUT_FPS)
+
+if ARG_OUTPUTS in config.value_args:
+    outputs = [
+        OutputSpec.parse(output) for output in config.value_args[ARG_OUTPUTS].split(",")
+    ]
+else:
+    outputs = [OutputSpec(OUT_VIDEO_DEVICE_ID, OUT_WIDTH, OUT_HEIGHT, fps)]
 
 # Setup app.
-video_device = virtualvideo.FakeVideoDevice()
-video_device.init_input(VideoProxy(config, fps))
-video_device.init_output(OUT_VIDEO_DEVICE_ID, OUT_WIDTH, OUT_HEIGHT, fps)
-video_device.run()
+VideoProxy(config, outputs).run()
@@ -0,0 +1,79 @@
+import collections
+import logging
+import sys
+import numpy
+
+from conf import *
+
+
+#
+# Estimated memory retained by a value: numpy buffers by their size, containers with their items (up to `depth`
+# levels deep), objects implementing `retained_bytes` by their own account.
+#
+def estimate_bytes(value, depth=3):
+    if isinstance(value, numpy.ndarray):
+        return value.nbytes
+
+    # Classes (eg factories) only have the unbound method.
+    if hasattr(value, "retained_bytes") and not isinstance(value, type):
+        return value.retained_bytes()
+
+    size = sys.getsizeof(value)
+    if depth <= 0:
+        return size
+
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_bytes(key, depth - 1) + estimate_bytes(item, depth - 1)
+    elif isinstance(value, (list, tuple, set, collections.deque)):
+        for item in value:
+            size += estimate_bytes(item, depth - 1)
+
+    return size
+
+
+# Sum of the estimated size of all attributes of an object.
+def estimate_attribute_bytes(obj):
+    return sum(estimate_bytes(value) for value in vars(obj).values())
+
+
+#
+# Periodic memory accounting of the long living parts of the app (passes, caches). Each accounted object reports
+# its retained bytes (`retained_bytes`), the results are logged and kept for the memory HUD.
+#
+class MemoryBudget:
+    def __init__(self, accounted, report_interval=MEMORY_REPORT_INTERVAL):
+        # Pairs of (name, object).
+        self.accounted = accounted
+        self.report_interval = report_interval
+        self.next_report = None
+        self.usage = []
+
+    def check(self, now):
+        if self.next_report is not None and now < self.next_report:
+            return
+
+        self.next_report = now + self.report_interval
+        self.usage = [(name, obj.retained_bytes()) for name, obj in self.accounted]
+
+        logging.info(
+            "Memory: "
+            + ", ".join(name + " " + format_bytes(size) for name, size in self.usage)
+            + " (total "
+            + format_bytes(self.total())
+            + ")"
+        )
+
+    def total(self):
+        return sum(size for _, size in self.usage)
+
+    # Measure (and report) again on the next check.
+    def invalidate(self):
+        self.next_report = None
+
+
+def format_bytes(size):
+    if size >= 1 << 20:
+        return str(int(size / (1 << 20) * 10) / 10) + "MB"
+    else:
+        return str(int(size / (1 << 10) * 10) / 10) + "KB"
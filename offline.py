@@ -0,0 +1,140 @@
+"""
+Pooce offline runner
+
+Processes a recorded video file through the render passes, in batches of frames, and writes the result into a
+new video file. Time based passes follow the recording's clock, not the wall clock. Batching only covers the
+stateless analysis (the car detector's neural net), every frame is updated and drawn in order - the other passes
+run at their live speed.
+
+The interactive passes (STDIN typing, Morse code, timer, shell commands) are not meant for offline runs, the
+default pass mask leaves them out.
+
+Usage: python offline.py INPUT OUTPUT [--batch=N] [--passes=MASK]
+"""
+
+import cv2
+import numpy
+import sys
+import time
+import logging
+
+from conf import *
+from shared import *
+from pipeline import *
+
+logging.basicConfig(level=logging.INFO)
+
+
+#
+# Runs the passes of the mask over a video file batch by batch: the analysis of a batch runs at once (see
+# `analyze_batch`), then every frame is updated, drawn and written.
+#
+class OfflineRunner:
+    def __init__(self, render_passes, pass_mask, batch_size=OFFLINE_BATCH_SIZE):
+        self.render_passes = render_passes
+        self.graph = PassGraph(render_passes)
+        self.pass_mask = pass_mask
+        self.batch_size = batch_size
+
+    def run(self, input_path, output_path):
+        capture = cv2.VideoCapture(input_path)
+        if not capture.isOpened():
+            raise IOError("Cannot open video: " + input_path)
+
+        fps = capture.get(cv2.CAP_PROP_FPS) or OUT_FPS
+        writer = cv2.VideoWriter(
+            output_path,
+            cv2.VideoWriter_fourcc(*"mp4v"),
+            fps,
+            (OUT_WIDTH, OUT_HEIGHT),
+        )
+
+        # Frames are read straight into the batch, the contexts (and their buffers) are reused between batches.
+        batch = numpy.empty((self.batch_size, OUT_HEIGHT, OUT_WIDTH, 3), numpy.uint8)
+        contexts = [FrameContext() for _ in range(self.batch_size)]
+        events_per_frame = [FrameEvents() for _ in range(self.batch_size)]
+
+        # Unlike live, frames are not dropped while models load.
+        for render_pass in self.render_passes:
+            render_pass.wait_resources()
+
+        start = time.monotonic()
+        frame_count = 0
+
+        while True:
+            count = 0
+            while count < self.batch_size:
+                rval, frame = capture.read()
+                if not rval:
+                    break
+
+                if frame.shape[:2] == (OUT_HEIGHT, OUT_WIDTH):
+                    batch[count] = frame
+                else:
+                    cv2.resize(frame, (OUT_WIDTH, OUT_HEIGHT), dst=batch[count])
+
+                contexts[count].reset(batch[count], now=frame_count / fps, dt=1.0 / fps)
+                count += 1
+                frame_count += 1
+
+            if count == 0:
+                break
+
+            self.process(
+                batch[:count], events_per_frame[:count], contexts[:count], writer
+            )
+
+        capture.release()
+        writer.release()
+
+        elapsed = time.monotonic() - start
+        logging.info(
+            "Processed "
+            + str(frame_count)
+            + " frames in "
+            + str(int(elapsed * 100) / 100)
+            + "s ("
+            + str(int(frame_count / max(elapsed, 1e-6) * 10 / fps) / 10)
+            + "x real time)"
+        )
+
+    def process(self, frames, events_per_frame, contexts, writer):
+        self.graph.analyze_batch(frames, self.pass_mask, contexts)
+
+        for img, events, ctx in zip(frames, events_per_frame, contexts):
+            self.graph.update(img, events, self.pass_mask, ctx)
+
+            for i, render_pass in enumerate(self.render_passes):
+                if self.pass_mask & (1 << i) > 0:
+                    img = render_pass.draw(img)
+
+            writer.write(img)
+
+
+# Mask of all the passes except the interactive ones.
+def offline_pass_mask(render_passes):
+    mask = 0
+    for i, render_pass in enumerate(render_passes):
+        if not render_pass.interactive:
+            mask |= 1 << i
+
+    return mask
+
+
+if __name__ == "__main__":
+    config = EnvConfig()
+    if len(config.flags) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    render_passes = default_render_passes()
+    pass_mask = offline_pass_mask(render_passes)
+    if ARG_PASSES in config.value_args:
+        pass_mask = int(config.value_args[ARG_PASSES], 0)
+
+    runner = OfflineRunner(
+        render_passes,
+        pass_mask,
+        int(config.value_args.get(ARG_BATCH) or OFFLINE_BATCH_SIZE),
+    )
+    runner.run(config.flags[1], config.flags[2])
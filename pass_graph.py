@@ -0,0 +1,74 @@
+import concurrent.futures
+
+from conf import *
+from shared import *
+from frame_context import *
+
+
+#
+# Schedules the updates of the enabled passes. Passes declare the derived images they read (`requires`), per frame
+# every required derived image is computed once in the frame context. Then passes marked `parallel` run
+# concurrently on a thread pool, while the rest run one after another on the calling thread, in list order (eg
+# passes reading STDIN).
+#
+class PassGraph:
+    def __init__(self, render_passes, workers=PASS_GRAPH_WORKERS):
+        self.render_passes = render_passes
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers)
+        # Pass mask -> (parallel passes, serial passes, required derived images).
+        self.schedules = {}
+
+    def schedule(self, mask):
+        if mask in self.schedules:
+            return self.schedules[mask]
+
+        enabled = [i for i in range(len(self.render_passes)) if mask & (1 << i) > 0]
+
+        parallel = [i for i in enabled if self.render_passes[i].parallel]
+        serial = [i for i in enabled if not self.render_passes[i].parallel]
+
+        # A single parallel pass is not worth the thread hop when there is nothing to overlap it with.
+        if len(parallel) == 1 and len(serial) == 0:
+            serial = parallel
+            parallel = []
+
+        required = []
+        for i in enabled:
+            for name in self.render_passes[i].requires:
+                if name not in required:
+                    required.append(name)
+
+        self.schedules[mask] = (parallel, serial, required)
+
+        return self.schedules[mask]
+
+    def update(self, img, events, mask, ctx):
+        parallel, serial, required = self.schedule(mask)
+
+        # Shared intermediates are computed up front, so parallel passes don't wait on each other for them.
+        ctx.prepare(required)
+
+        self.execute(parallel, serial, "update", (img, events, ctx))
+
+    # Prepares a batch of frames (offline processing): derived images and the batch analysis of the passes (see
+    # `OutputRenderPass.analyze_batch`). The frames are then updated one by one.
+    def analyze_batch(self, frames, mask, contexts):
+        parallel, serial, required = self.schedule(mask)
+
+        derive_batch(contexts, frames, required)
+        for ctx in contexts:
+            ctx.prepare(required)
+
+        self.execute(parallel, serial, "analyze_batch", (frames, contexts))
+
+    def execute(self, parallel, serial, method, args):
+        futures = [
+            self.executor.submit(getattr(self.render_passes[i], method), *args)
+            for i in parallel
+        ]
+
+        for i in serial:
+            getattr(self.render_passes[i], method)(*args)
+
+        for future in futures:
+            future.result()
@@ -0,0 +1,377 @@
+import cv2
+
+from conf import *
+from shared import *
+from text_engine import *
+from pass_graph import *
+from plugins.pong import PongRenderPass
+from plugins.rain import RandomFlashRenderPass
+from plugins.static_text import StaticTextRenderPass
+from plugins.shell_watch import ShellWatcherRenderPass
+from plugins.typing_text import TypingTextRenderPass
+from plugins.shape_detection import CarDrawRenderPass
+from plugins.color_detection import ColorBlobDrawRenderPass
+from plugins.template_detection import TemplateRecognitionDrawRenderPass
+from plugins.mouse_drawing import MouseDrawRenderPass
+from plugins.morse_code import MorseCodeRenderPass
+from plugins.timer import TimerRenderPass
+
+
+def default_render_passes():
+    return [
+        StaticTextRenderPass("Video Proxy Demo v0.1"),
+        RandomFlashRenderPass(),
+        TypingTextRenderPass(),
+        MorseCodeRenderPass(),
+        PongRenderPass(),
+        ShellWatcherRenderPass(["vmstat"], 10, 8),
+        ShellWatcherRenderPass(
+            ["cat", "experiment/notepad.txt"],
+            10,
+            300,
+            30,
+            scroll_keys=(ord(","), ord(".")),
+        ),
+        MouseDrawRenderPass(),
+        TimerRenderPass(),
+        TemplateRecognitionDrawRenderPass(),
+        ColorBlobDrawRenderPass(),
+        CarDrawRenderPass(),
+    ]
+
+
+#
+# Converts a control API value (decoded JSON) to the type of the current value of a tunable, or raises ValueError
+# when it doesn't fit. Tuples are records (same length, each item like the current one), lists are sequences of
+# items like their first one and must not be empty.
+#
+def coerce_tunable(current, value):
+    if isinstance(current, bool):
+        if isinstance(value, bool):
+            return value
+    elif isinstance(current, int):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    elif isinstance(current, float):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    elif isinstance(current, str):
+        if isinstance(value, str):
+            return value
+    elif isinstance(current, tuple):
+        if isinstance(value, list) and len(value) == len(current):
+            return tuple(coerce_tunable(c, v) for c, v in zip(current, value))
+    elif isinstance(current, list):
+        if isinstance(value, list) and len(value) > 0:
+            if len(current) == 0:
+                return list(value)
+
+            return [coerce_tunable(current[0], v) for v in value]
+
+    raise ValueError("Expected a value like " + repr(current) + ", got " + repr(value))
+
+
+#
+# Description of an output (sink): device, resolution, frame rate and the passes drawn onto it.
+# Text form (see `--outputs`): DEVICE:WIDTHxHEIGHT@FPS[:MASK], where mask is `keys` (follows the key toggles,
+# default), `all` or a pass bitmask (eg `0` for a clean feed, `0b110`).
+#
+class OutputSpec:
+    def __init__(self, device_id, width, height, fps, pass_mask=None):
+        self.device_id = device_id
+        self.width = width
+        self.height = height
+        self.fps = fps
+        # None: controlled by the keyboard toggles.
+        self.pass_mask = pass_mask
+
+    @staticmethod
+    def parse(text):
+        parts = text.split(":")
+        size, fps = parts[1].split("@")
+        width, height = size.split("x")
+
+        pass_mask = None
+        if len(parts) > 2 and parts[2] != "keys":
+            if parts[2] == "all":
+                pass_mask = OUTPUT_RENDER_PASS_MASK_ALL
+            else:
+                pass_mask = int(parts[2], 0)
+
+        return OutputSpec(int(parts[0]), int(width), int(height), int(fps), pass_mask)
+
+    def __str__(self):
+        if self.pass_mask is None:
+            mask = "keys"
+        elif self.pass_mask == OUTPUT_RENDER_PASS_MASK_ALL:
+            mask = "all"
+        else:
+            mask = bin(self.pass_mask)
+
+        return "/dev/video{} {}x{}@{} passes: {}".format(
+            self.device_id, self.width, self.height, self.fps, mask
+        )
+
+
+#
+# Render pipeline fanning out one input frame to multiple outputs. Pass updates (analysis, state) run once per
+# frame for every pass enabled on any output (scheduled by the pass graph), then each output gets its own copy
+# of the frame with its own passes drawn - in list order, as overlays paint over each other. Finished frames are
+# published to the output's frame slot, sinks pick them up from there.
+#
+class Pipeline:
+    def __init__(self, render_passes, outputs):
+        self.render_passes = render_passes
+        self.graph = PassGraph(render_passes)
+        self.ctx = FrameContext()
+        self.outputs = outputs
+        self.output_slots = [FrameSlot() for _ in outputs]
+
+        # Pass mask of the outputs following the key toggles.
+        self.output_render_pass_mask = 1
+
+        self.memory = MemoryBudget(
+            [(render_pass.name(), render_pass) for render_pass in render_passes]
+            + [("Text engine", text_engine), ("Frame context", self.ctx)]
+        )
+        # Memory usage shown on the outputs following the key toggles.
+        self.show_memory = False
+
+        # Processing frame rate cap (control API), None: every camera frame is processed.
+        self.max_fps = None
+        self.next_frame = None
+
+        self.frame_count = 0
+        # Moving average of the frame time, for the metrics.
+        self.frame_time = None
+
+    def toggle_memory_hud(self):
+        self.show_memory = not self.show_memory
+        if self.show_memory:
+            self.memory.invalidate()
+
+    def pass_mask(self, output):
+        if output.pass_mask is None:
+            return self.output_render_pass_mask
+        else:
+            return output.pass_mask
+
+    def process(self, img, events):
+        masks = [self.pass_mask(output) for output in self.outputs]
+
+        union_mask = 0
+        for mask in masks:
+            union_mask |= mask
+
+        self.ctx.reset(img)
+        self.graph.update(img, events, union_mask, self.ctx)
+        self.memory.check(self.ctx.clock.now)
+        self.count_frame(self.ctx.clock.dt)
+
+        last = len(self.outputs) - 1
+        for i, output in enumerate(self.outputs):
+            # The last output can draw on the input frame itself, the rest have already copied it.
+            output_img = img if i == last else img.copy()
+            output_img = self.draw(output_img, masks[i])
+            if self.show_memory and output.pass_mask is None:
+                self.draw_memory(output_img)
+
+            if (
+                output_img.shape[1] != output.width
+                or output_img.shape[0] != output.height
+            ):
+                output_img = cv2.resize(
+                    output_img,
+                    (output.width, output.height),
+                    interpolation=cv2.INTER_AREA,
+                )
+
+            self.output_slots[i].publish(output_img)
+
+    def count_frame(self, dt):
+        self.frame_count += 1
+        if dt <= 0.0:
+            return
+
+        if self.frame_time is None:
+            self.frame_time = dt
+        else:
+            self.frame_time = 0.9 * self.frame_time + 0.1 * dt
+
+    # Whether a new input frame should be processed now or dropped, according to the frame rate cap.
+    def frame_due(self, now):
+        if self.max_fps is None:
+            return True
+
+        if self.next_frame is not None and now < self.next_frame:
+            return False
+
+        # Deadlines follow a fixed grid, unless the loop fell behind.
+        period = 1.0 / self.max_fps
+        if self.next_frame is None or now - self.next_frame > period:
+            self.next_frame = now + period
+        else:
+            self.next_frame += period
+
+        return True
+
+    #
+    # Runtime control (see `ControlServer`), called by the render loop between frames. Commands are dicts with
+    # the command name in `cmd`, the reply is a dict with `ok` (and `error` when failed):
+    # - passes: list of the passes (index, name, state on the key toggles and on each output, tunable parameters)
+    #   and of the outputs (index, device, fixed pass mask or null when following the key toggles)
+    # - enable / disable: `pass` index, on the given `output` (index) or on the outputs following the key toggles.
+    #   An output following the key toggles gets a fixed mask
+    # - mask: fixed pass `mask` of an `output`, null to follow the key toggles again
+    # - set: `value` of a tunable `param` of a `pass`
+    # - fps: processing frame rate cap (`value`, null for none)
+    # - metrics: frame count and rate, memory usage and startup timing
+    #
+    def control(self, command):
+        cmd = command.get("cmd")
+
+        if cmd == "passes":
+            return {
+                "ok": True,
+                "passes": [
+                    self.describe_pass(i) for i in range(len(self.render_passes))
+                ],
+                "outputs": [
+                    {"index": i, "device": output.device_id, "mask": output.pass_mask}
+                    for i, output in enumerate(self.outputs)
+                ],
+            }
+        elif cmd == "enable" or cmd == "disable":
+            bit = 1 << self.pass_index(command)
+
+            if command.get("output") is None:
+                mask = self.output_render_pass_mask
+            else:
+                output = self.outputs[self.output_index(command)]
+                mask = self.pass_mask(output)
+
+            mask = mask | bit if cmd == "enable" else mask & ~bit
+
+            if command.get("output") is None:
+                self.output_render_pass_mask = mask
+            else:
+                output.pass_mask = mask
+
+            return {"ok": True}
+        elif cmd == "mask":
+            output = self.outputs[self.output_index(command)]
+            if "mask" not in command:
+                raise ValueError("Missing mask")
+
+            mask = command["mask"]
+            if mask is not None:
+                mask = coerce_tunable(0, mask)
+                if mask < 0:
+                    raise ValueError("Invalid mask: " + str(mask))
+
+            output.pass_mask = mask
+            return {"ok": True}
+        elif cmd == "set":
+            render_pass = self.render_passes[self.pass_index(command)]
+            param = command.get("param")
+            if param not in render_pass.tunables:
+                raise ValueError(
+                    "Not a tunable of " + render_pass.name() + ": " + str(param)
+                )
+
+            value = coerce_tunable(getattr(render_pass, param), command.get("value"))
+            setattr(render_pass, param, value)
+            return {"ok": True}
+        elif cmd == "fps":
+            value = command.get("value")
+            if value is not None:
+                value = coerce_tunable(1.0, value)
+                if value <= 0:
+                    raise ValueError("Invalid frame rate: " + str(value))
+
+            self.max_fps = value
+            self.next_frame = None
+            return {"ok": True}
+        elif cmd == "metrics":
+            return {
+                "ok": True,
+                "frames": self.frame_count,
+                "fps": None if not self.frame_time else 1.0 / self.frame_time,
+                "memory": dict(self.memory.usage),
+                "startup": profiler.report(),
+            }
+        else:
+            raise ValueError("Unknown command: " + str(cmd))
+
+    def describe_pass(self, i):
+        render_pass = self.render_passes[i]
+        return {
+            "index": i,
+            "name": render_pass.name(),
+            "enabled": self.output_render_pass_mask & (1 << i) > 0,
+            "outputs": [
+                self.pass_mask(output) & (1 << i) > 0 for output in self.outputs
+            ],
+            "params": {
+                param: getattr(render_pass, param) for param in render_pass.tunables
+            },
+        }
+
+    def pass_index(self, command):
+        i = command.get("pass")
+        if not isinstance(i, int) or i < 0 or i >= len(self.render_passes):
+            raise ValueError("Invalid pass: " + str(i))
+
+        return i
+
+    def output_index(self, command):
+        i = command.get("output")
+        if not isinstance(i, int) or i < 0 or i >= len(self.outputs):
+            raise ValueError("Invalid output: " + str(i))
+
+        return i
+
+    def draw_memory(self, img):
+        lines = [
+            name + ": " + format_bytes(size)
+            for name, size in self.memory.usage
+            if size >= 1 << 10
+        ]
+        lines.append("Total: " + format_bytes(self.memory.total()))
+
+        for i, line in enumerate(lines):
+            draw_text(
+                img,
+                line,
+                (OUT_WIDTH - 250, 140 + (i * 20)),
+                scale=0.5,
+                color=COLOR_LAGUNA_BLUE,
+                thickness=1,
+                outline_color=COLOR_BLACK,
+                outline_thickness=3,
+                mirrored=True,
+            )
+
+    def draw(self, img, mask):
+        used_passes = []
+        for i, output_render_pass in enumerate(self.render_passes):
+            if mask & (1 << i) > 0:
+                img = output_render_pass.draw(img)
+                used_passes.append(output_render_pass.name())
+
+        if len(used_passes) == 0:
+            return img
+
+        # Printing active passes on the screen.
+        for i, pass_name in enumerate(used_passes):
+            draw_text(
+                img,
+                pass_name,
+                (OUT_WIDTH - 250, OUT_HEIGHT - 20 - (i * 20)),
+                scale=0.5,
+                color=COLOR_WHITE,
+                thickness=2,
+                mirrored=True,
+            )
+
+        return img
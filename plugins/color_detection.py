@@ -0,0 +1,141 @@
+import cv2
+import numpy
+
+from conf import *
+from shared import *
+
+# Detected marker colors: name, Lab threshold (lower, upper) and the color it's drawn with.
+COLOR_MARKERS = [
+    ("red", (20, 150, 150), (190, 255, 255), COLOR_RED),
+    ("yellow", (20, 110, 170), (255, 140, 215), COLOR_YELLOW),
+    ("blue", (20, 115, 70), (255, 145, 120), COLOR_BLUE),
+]
+
+# Bits kept per BGR channel in the color lookup table (32 x 32 x 32 bins).
+COLOR_LUT_BITS = 5
+
+
+#
+# Color lookup table: quantized BGR color (index: b << 10 | g << 5 | r) -> 1 + index of the first matching color,
+# 0 for none. Colors are classified by the Lab value of the bin centers.
+#
+def build_color_lut(colors):
+    shift = 8 - COLOR_LUT_BITS
+    bins = 1 << COLOR_LUT_BITS
+
+    centers = (numpy.indices((bins, bins, bins)) << shift) + (1 << (shift - 1))
+    centers = centers.reshape(3, -1).T.reshape(-1, 1, 3).astype(numpy.uint8)
+    lab = cv2.cvtColor(centers, cv2.COLOR_BGR2Lab).reshape(-1, 3)
+
+    lut = numpy.zeros(len(lab), numpy.uint8)
+    # In reverse, so the first matching color wins.
+    for i in reversed(range(len(colors))):
+        _, lower, upper, _ = colors[i]
+        matching = numpy.all((lab >= lower) & (lab <= upper), axis=1)
+        lut[matching] = i + 1
+
+    return lut
+
+
+#
+# Render pass that draws at the locations of colored markers, one drawer per color. All colors are classified in a
+# single lookup (see `build_color_lut`) on the half size frame, the marker of a color is its largest blob
+# (connected component) within the area limits. Mouse middle click is reset. Drawers are made by `make_drawer`
+# (color -> drawer), eg to set their cap and eviction policy.
+#
+class ColorBlobDrawRenderPass(OutputRenderPass):
+    requires = ("half",)
+    parallel = True
+    tunables = ("colors", "min_area", "max_area")
+
+    def __init__(self, colors=COLOR_MARKERS, make_drawer=LineDrawer):
+        self.colors = colors
+        self.make_drawer = make_drawer
+        # Blob area range, in pixels of the half size frame.
+        self.min_area = 20
+        self.max_area = 3000
+
+        # Color name -> drawer.
+        self.drawers = {}
+        # Colors the lookup table was built for, rebuilt when changed.
+        self.lut_colors = None
+        self.lut = None
+
+        # Per frame buffers.
+        self.quantized = None
+        self.index = None
+        self.index_part = None
+        self.labels = None
+        self.mask = None
+
+    def name(self):
+        return "Color marker recognition (drawing)"
+
+    def prepare(self, shape):
+        if self.colors != self.lut_colors:
+            self.lut = build_color_lut(self.colors)
+            self.lut_colors = self.colors
+
+            for color_name, _, _, draw_color in self.colors:
+                if color_name not in self.drawers:
+                    self.drawers[color_name] = self.make_drawer(draw_color)
+
+        if self.labels is None or self.labels.shape != shape[:2]:
+            self.quantized = numpy.empty(shape, numpy.uint8)
+            self.index = numpy.empty(shape[:2], numpy.uint16)
+            self.index_part = numpy.empty(shape[:2], numpy.uint16)
+            self.labels = numpy.empty(shape[:2], numpy.uint8)
+            self.mask = numpy.empty(shape[:2], numpy.uint8)
+
+    def update(self, img, events, ctx):
+        for event in events.clicks:
+            if event.mouse_click == EVENT_MOUSE_MIDDLE_DOWN:
+                for drawer in self.drawers.values():
+                    drawer.reset()
+
+        half = ctx["half"]
+        self.prepare(half.shape)
+
+        # Lookup table index of every pixel, then its color label.
+        numpy.right_shift(half, 8 - COLOR_LUT_BITS, out=self.quantized)
+        numpy.left_shift(
+            self.quantized[:, :, 0],
+            COLOR_LUT_BITS << 1,
+            out=self.index,
+            dtype=numpy.uint16,
+        )
+        numpy.left_shift(
+            self.quantized[:, :, 1],
+            COLOR_LUT_BITS,
+            out=self.index_part,
+            dtype=numpy.uint16,
+        )
+        self.index |= self.index_part
+        self.index |= self.quantized[:, :, 2]
+        numpy.take(self.lut, self.index, out=self.labels)
+
+        scale = img.shape[1] / half.shape[1]
+
+        for i, (color_name, _, _, _) in enumerate(self.colors):
+            cv2.compare(self.labels, i + 1, cv2.CMP_EQ, dst=self.mask)
+            count, _, stats, centroids = cv2.connectedComponentsWithStats(
+                self.mask, connectivity=8
+            )
+
+            # Largest blob within the limits (component 0 is the background).
+            areas = stats[1:, cv2.CC_STAT_AREA]
+            areas = numpy.where(
+                (areas >= self.min_area) & (areas <= self.max_area), areas, 0
+            )
+            if len(areas) > 0 and areas.max() > 0:
+                best = 1 + int(areas.argmax())
+                x = int(centroids[best, 0] * scale)
+                y = int(centroids[best, 1] * scale)
+                self.drawers[color_name].record(x, y)
+
+    def draw(self, img):
+        for color_name, _, _, _ in self.colors:
+            if color_name in self.drawers:
+                self.drawers[color_name].draw(img)
+
+        return img
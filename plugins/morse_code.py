@@ -8,6 +8,9 @@ from shared import *
 # Render pass that turns input to morse code.
 #
 class MorseCodeRenderPass(OutputRenderPass):
+    interactive = True
+    tunables = ("tick_length", "tick_gap", "tick_letter_gap")
+
     def __init__(self):
         self.table = [
             [1, 3],  # a
@@ -39,6 +42,8 @@ class MorseCodeRenderPass(OutputRenderPass):
         ]
         self.queue = []
         self.counter = -1
+        # Ticks are fixed simulation steps, so the timing is the same at any frame rate.
+        self.timestep = FixedTimestep()
 
         # How long a single unit will flash.
         self.tick_length = 6
@@ -49,7 +54,7 @@ class MorseCodeRenderPass(OutputRenderPass):
     def name(self):
         return "Morse code"
 
-    def render(self, img, events):
+    def update(self, img, events, ctx):
         line = non_block_stdin_get_line()
         if line is not None:
             for c in line:
@@ -58,6 +63,10 @@ class MorseCodeRenderPass(OutputRenderPass):
                     self.queue += self.table[ord(c) - ord("a")]
                     self.queue.append(-1)  # Letter gap.
 
+        for _ in range(self.timestep.advance(ctx.clock.dt)):
+            self.tick()
+
+    def tick(self):
         if self.counter < 0:
             if len(self.queue) > 0:
                 if self.queue[0] == -1:
@@ -69,6 +78,7 @@ class MorseCodeRenderPass(OutputRenderPass):
             if self.counter < 0:
                 self.queue = self.queue[1:]
 
+    def draw(self, img):
         if self.counter >= self.tick_gap and self.queue[0] != -1:
             cv2.circle(img, (OUT_WIDTH >> 1, OUT_HEIGHT - 100), 42, COLOR_ORANGE, -1)
 
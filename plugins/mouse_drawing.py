@@ -5,19 +5,20 @@ from shared import *
 
 
 #
-# Output pass that draws with the mouse. Middle button click is reset.
+# Output pass that draws with the mouse. Middle button click is reset. The drawer (and so its cap and eviction
+# policy) can be given.
 #
 class MouseDrawRenderPass(OutputRenderPass):
-    def __init__(self):
+    def __init__(self, drawer: DotDrawer = None):
         self.is_mouse_down = False
-        self.drawer = LineDrawer(COLOR_MAGENTA)
+        self.drawer = drawer if drawer is not None else LineDrawer(COLOR_MAGENTA)
         self.last_pos = (0, 0)
 
     def name(self):
         return "Mouse drawing"
 
-    def render(self, img, events):
-        for event in events:
+    def update(self, img, events, ctx):
+        for event in events.mouse:
             if event.mouse_click == EVENT_MOUSE_LEFT_DOWN:
                 self.is_mouse_down = True
             elif event.mouse_click == EVENT_MOUSE_LEFT_UP:
@@ -26,13 +27,14 @@ class MouseDrawRenderPass(OutputRenderPass):
             elif event.mouse_click == EVENT_MOUSE_MIDDLE_DOWN:
                 self.drawer.reset()
             elif event.mouse_pos is not None:
+                # Coalesced moves keep every point of the stroke.
                 if self.is_mouse_down:
-                    self.drawer.record(
-                        OUT_WIDTH - event.mouse_pos[0], event.mouse_pos[1]
-                    )
+                    for x, y in event.mouse_stroke:
+                        self.drawer.record(OUT_WIDTH - x, y)
 
                 self.last_pos = (OUT_WIDTH - event.mouse_pos[0], event.mouse_pos[1])
 
+    def draw(self, img):
         self.drawer.draw(img)
         cv2.circle(img, self.last_pos, 8, COLOR_WHITE, 4)
 
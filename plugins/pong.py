@@ -1,16 +1,24 @@
 import cv2
 from shared import *
+from text_engine import *
 
 
 #
 # Render pass that plays pong. Keys `a` and `d` are left/right.
+# The ball moves in fixed simulation steps (speed is per step), drawn interpolated between the last two steps.
 #
 class PongRenderPass(OutputRenderPass):
+    tunables = ("bat_size",)
+
     def __init__(self):
         self.x = 10
         self.y = 10
+        self.prev_x = self.x
+        self.prev_y = self.y
         self.size = 16
         self.speed = 20
+        self.timestep = FixedTimestep()
+        self.alpha = 0.0
         self.vx = self.speed
         self.vy = self.speed
 
@@ -21,7 +29,18 @@ class PongRenderPass(OutputRenderPass):
     def name(self):
         return "Pong (game)"
 
-    def render(self, img, events):
+    def update(self, img, events, ctx):
+        for _ in range(self.timestep.advance(ctx.clock.dt)):
+            self.step()
+        self.alpha = self.timestep.alpha()
+
+        if len(events.moves) > 0:
+            self.bat_x = OUT_WIDTH - events.moves[-1].mouse_pos[0]
+
+    def step(self):
+        self.prev_x = self.x
+        self.prev_y = self.y
+
         x_candidate = self.x + self.vx
         y_candidate = self.y + self.vy
 
@@ -42,10 +61,7 @@ class PongRenderPass(OutputRenderPass):
         self.x += self.vx
         self.y += self.vy
 
-        for event in events:
-            if event.mouse_pos is not None:
-                self.bat_x = OUT_WIDTH - event.mouse_pos[0]
-
+    def draw(self, img):
         cv2.rectangle(
             img,
             (self.bat_x - (self.bat_size >> 1), OUT_HEIGHT - 30),
@@ -54,16 +70,16 @@ class PongRenderPass(OutputRenderPass):
             -1,
         )
 
-        img = cv2.flip(img, 1)
-        cv2.putText(
+        draw_text(
             img,
             "Score: " + str(self.score),
             (OUT_WIDTH - self.bat_x - (self.bat_size >> 1), OUT_HEIGHT - 6),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            1,
-            COLOR_BLACK,
-            2,
+            color=COLOR_BLACK,
+            thickness=2,
+            mirrored=True,
         )
-        img = cv2.flip(img, 1)
 
-        return cv2.circle(img, (self.x, self.y), self.size, COLOR_GREEN, -1)
+        x = int(self.prev_x + (self.x - self.prev_x) * self.alpha)
+        y = int(self.prev_y + (self.y - self.prev_y) * self.alpha)
+
+        return cv2.circle(img, (x, y), self.size, COLOR_GREEN, -1)
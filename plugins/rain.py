@@ -1,25 +1,34 @@
 import random
+import numpy
 from shared import *
 
 
 #
-# This render pass demonstrates 2D graphics animation (rain).
+# This render pass demonstrates 2D graphics animation (rain). Drops fall in fixed simulation steps (speed and
+# spawn chance are per step).
 #
 class RandomFlashRenderPass(OutputRenderPass):
+    tunables = ("speed",)
+
     def __init__(self):
-        self.drops = [OUT_HEIGHT] * OUT_WIDTH
+        self.drops = numpy.full(OUT_WIDTH, OUT_HEIGHT)
         self.speed = 50
+        self.timestep = FixedTimestep()
 
     def name(self):
         return "Rain (animation)"
 
-    def render(self, img, events):
-        if random.random() < 0.4:
-            self.drops[random.randrange(0, OUT_WIDTH)] = 0
+    def update(self, img, events, ctx):
+        for _ in range(self.timestep.advance(ctx.clock.dt)):
+            if random.random() < 0.4:
+                self.drops[random.randrange(0, OUT_WIDTH)] = -self.speed
+
+            falling = self.drops < OUT_HEIGHT
+            self.drops[falling] += self.speed
 
-        for x, y in enumerate(self.drops):
-            if y < OUT_HEIGHT:
-                self.drops[x] += self.speed
-                img[y : (y + 20), x : (x + 10)] = COLOR_BLUE
+    def draw(self, img):
+        for x in numpy.flatnonzero(self.drops < OUT_HEIGHT):
+            y = self.drops[x]
+            img[y : (y + 20), x : (x + 10)] = COLOR_BLUE
 
         return img
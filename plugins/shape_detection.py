@@ -7,33 +7,75 @@ from shared import *
 
 #
 # Render pass that draws by tracking shapes. Currently it's looking for cars, though
-# it's crazy bad and inefficient. It has troubles with moving and lights.
+# it's crazy bad and inefficient. It has troubles with moving and lights. The model is loaded (and warmed up)
+# in the background, the pass is idle until then. The drawer (and so its cap and eviction policy) can be given.
 #
 # @link https://medium.com/featurepreneur/object-detection-using-single-shot-multibox-detection-ssd-and-opencvs-deep-neural-network-dnn-d983e9d52652
 #
 class CarDrawRenderPass(OutputRenderPass):
-    def __init__(self):
-        self.net = cv2.dnn.readNetFromCaffe(
+    requires = ("ssd_blob",)
+    parallel = True
+    tunables = ("confidence",)
+
+    def __init__(self, drawer: DotDrawer = None):
+        self.net = BackgroundResource("car model", self.load_net)
+        self.drawer = (
+            drawer if drawer is not None else SimpleDotDrawer((0, 0, 255), cv2.LINE_AA)
+        )
+        # Minimum confidence of a detection.
+        self.confidence = 0.5
+
+    def load_net(self):
+        net = cv2.dnn.readNetFromCaffe(
             "model/MobileNetSSD_deploy.prototxt",
             "model/MobileNetSSD_deploy.caffemodel",
         )
-        self.map = [0] * (OUT_HEIGHT * OUT_WIDTH)
+
+        # The first forward pass allocates and initializes the layers, get it out of the way of the first frame.
+        net.setInput(numpy.zeros((1, 3, 300, 300), numpy.float32))
+        net.forward()
+
+        return net
 
     def name(self):
         return "Car recognition (drawing)"
 
-    def render(self, img, events):
-        blob = cv2.dnn.blobFromImage(img, 0.007843, (300, 300), 127.5)
+    def update(self, img, events, ctx):
+        # Already evaluated with its batch (offline processing).
+        detections = ctx.get("ssd_detections")
+
+        if detections is None:
+            net = self.net.get()
+            if net is None:
+                return
+
+            net.setInput(ctx["ssd_blob"])
+            detections = net.forward()[0, 0]
+
+        self.record(detections, img)
+
+    # The net evaluates the whole batch in a single forward pass.
+    def analyze_batch(self, frames, contexts):
+        net = self.net.get()
+        if net is None:
+            return
+
+        net.setInput(numpy.concatenate([ctx["ssd_blob"] for ctx in contexts]))
+        detections = net.forward()[0, 0]
+
+        # First value of a detection is the index of its frame in the batch.
+        for i, ctx in enumerate(contexts):
+            ctx["ssd_detections"] = detections[detections[:, 0] == i]
+
+    def record(self, detections, img):
         h, w = img.shape[:2]
-        self.net.setInput(blob)
-        detections = self.net.forward()
 
-        for i in numpy.arange(0, detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
-            if confidence <= 0.5:
+        for detection in detections:
+            confidence = detection[2]
+            if confidence <= self.confidence:
                 continue
 
-            idx = int(detections[0, 0, i, 1])
+            idx = int(detection[1])
             # For reference.
             # CLASSES = [
             #     "background",
@@ -61,8 +103,8 @@ class CarDrawRenderPass(OutputRenderPass):
             if idx != 7:
                 continue
 
-            box = detections[0, 0, i, 3:7] * numpy.array([w, h, w, h])
-            (startX, startY, endX, endY) = box.astype("int")
+            box = detection[3:7] * numpy.array([w, h, w, h])
+            startX, startY, endX, endY = box.astype("int")
 
             if (
                 startX >= 0
@@ -70,12 +112,9 @@ class CarDrawRenderPass(OutputRenderPass):
                 and startY >= 0
                 and startY < OUT_HEIGHT
             ):
-                self.map[(startY * OUT_WIDTH) + startX] = 1
+                self.drawer.record(startX, startY)
 
-        for y in range(OUT_HEIGHT):
-            for x in range(OUT_WIDTH):
-                if self.map[(y * OUT_WIDTH) + x] == 0:
-                    continue
-                cv2.circle(img, (x, y), 4, (0, 0, 255), -1, cv2.LINE_AA)
+    def draw(self, img):
+        self.drawer.draw(img)
 
         return img
@@ -3,60 +3,78 @@ import cv2
 
 from conf import *
 from shared import *
+from text_engine import *
 
 
 #
-# Render pass that can execute a shell command and paint STDOUT to the frame.
+# Render pass that can execute a shell command and paint STDOUT to the frame. Only the lines fitting below `y`
+# are drawn, optional scroll keys (up, down) page through the rest.
 #
 class ShellWatcherRenderPass(OutputRenderPass):
-    def __init__(self, cmd_parts, frequency=10, x=OUT_WIDTH >> 1, y=OUT_HEIGHT >> 1):
+    tunables = ("cmd_parts", "frequency")
+    interactive = True
+
+    def __init__(
+        self,
+        cmd_parts,
+        frequency=10,
+        x=OUT_WIDTH >> 1,
+        y=OUT_HEIGHT >> 1,
+        scroll_keys=None,
+    ):
         self.cmd_parts = cmd_parts
 
         # To limit drawing to every frequency-th frame.
         self.frequency = frequency
         self.counter = frequency
-        self.output = []
 
         self.x = x
         self.y = y
+        self.line_height = 35
+        # Rows fitting on the frame.
+        self.rows = (OUT_HEIGHT - self.y) // self.line_height + 1
+
+        # Shown from the start of the output.
+        self.output = TextBuffer(wrap_width=OUT_WIDTH - self.x - 8, anchor_top=True)
+        self.scroll_keys = scroll_keys
 
     def name(self):
         return "Shell command (" + " ".join(self.cmd_parts) + ")"
 
-    def render(self, img, events):
+    def update(self, img, events, ctx):
         if self.counter >= self.frequency:
             self.counter = 0
 
-            output_bytes = subprocess.check_output(self.cmd_parts)
-            output_utf8 = output_bytes.decode("utf-8")
-            self.output = output_utf8.split("\n")
+            # The command can be changed at runtime (control API), a failing one is shown instead of its output.
+            try:
+                output_bytes = subprocess.check_output(self.cmd_parts)
+            except (OSError, subprocess.CalledProcessError) as e:
+                self.output.set_lines([str(e)])
+            else:
+                output_utf8 = output_bytes.decode("utf-8", errors="replace")
+                self.output.set_lines(output_utf8.rstrip("\n").split("\n"))
         else:
             self.counter += 1
 
-        img = cv2.flip(img, 1)
+        if self.scroll_keys is not None:
+            for event in events.keys:
+                if event.key_code == self.scroll_keys[0]:
+                    self.output.scroll_by(TEXT_SCROLL_STEP)
+                elif event.key_code == self.scroll_keys[1]:
+                    self.output.scroll_by(-TEXT_SCROLL_STEP)
 
-        for i, line in enumerate(self.output):
-            cv2.putText(
-                img,
-                line,
-                (self.x, self.y + (i * 35)),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                COLOR_BLACK,
-                4,
-                cv2.LINE_AA,
-            )
-            cv2.putText(
+    def draw(self, img):
+        for i, line in enumerate(self.output.visible_rows(self.rows)):
+            draw_text(
                 img,
                 line,
-                (self.x, self.y + (i * 35)),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                COLOR_WHITE,
-                2,
-                cv2.LINE_AA,
+                (self.x, self.y + (i * self.line_height)),
+                color=COLOR_WHITE,
+                thickness=2,
+                outline_color=COLOR_BLACK,
+                outline_thickness=4,
+                line_type=cv2.LINE_AA,
+                mirrored=True,
             )
 
-        img = cv2.flip(img, 1)
-
         return img
@@ -1,30 +1,28 @@
 import cv2
 from conf import *
 from shared import *
+from text_engine import *
 
 
 #
 # Render pass that paints a fixed text.
 #
 class StaticTextRenderPass(OutputRenderPass):
+    tunables = ("text",)
+
     def __init__(self, text):
         self.text = text
 
     def name(self):
         return "Static text"
 
-    def render(self, img, events):
-        img = cv2.flip(img, 1)
-
-        cv2.putText(
+    def draw(self, img):
+        return draw_text(
             img,
             self.text,
             (8, OUT_HEIGHT - 8),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            1,
-            COLOR_WHITE,
-            2,
-            cv2.LINE_AA,
+            color=COLOR_WHITE,
+            thickness=2,
+            line_type=cv2.LINE_AA,
+            mirrored=True,
         )
-
-        return cv2.flip(img, 1)
@@ -5,31 +5,49 @@ from shared import *
 
 
 #
-# Output pass that uses fixed template (pattern) recognition for drawing.
+# Output pass that uses fixed template (pattern) recognition for drawing. The template is loaded in the
+# background, the pass is idle until then. Matching runs on the half size frame (with a half size template). The drawer (and so its cap and eviction policy) can be given.
 #
 class TemplateRecognitionDrawRenderPass(OutputRenderPass):
-    def __init__(self):
-        self.template = cv2.imread("model/template.png", cv2.IMREAD_GRAYSCALE)
-        self.w, self.h = self.template.shape[::-1]
-        self.drawer = SimpleDotDrawer()
+    requires = ("half_gray",)
+    parallel = True
+
+    def __init__(self, drawer: DotDrawer = None):
+        self.template = BackgroundResource("template", self.load_template)
+        self.drawer = drawer if drawer is not None else SimpleDotDrawer()
+
+    def load_template(self):
+        template = load_grayscale_cached("model/template.png")
+
+        return cv2.resize(
+            template,
+            (template.shape[1] >> 1, template.shape[0] >> 1),
+            interpolation=cv2.INTER_AREA,
+        )
 
     def name(self):
         return "Template recognition (drawing)"
 
-    def render(self, img, events):
-        for event in events:
+    def update(self, img, events, ctx):
+        for event in events.clicks:
             if event.mouse_click == EVENT_MOUSE_MIDDLE_DOWN:
                 self.drawer.reset()
 
-        img_grayscale = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        template = self.template.get()
+        if template is None:
+            return
 
         # Apply template Matching
-        res = cv2.matchTemplate(img_grayscale, self.template, cv2.TM_CCOEFF)
+        res = cv2.matchTemplate(ctx["half_gray"], template, cv2.TM_CCOEFF)
         min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
         top_left = max_loc
 
-        self.drawer.record(top_left[0] + (self.w >> 1), top_left[1] + (self.h >> 1))
+        # Back to full size coordinates.
+        h, w = template.shape
+        center = ((top_left[0] << 1) + w, (top_left[1] << 1) + h)
+        self.drawer.record(center[0], center[1])
 
+    def draw(self, img):
         self.drawer.draw(img)
 
         return img
@@ -2,24 +2,28 @@ import time
 
 from conf import *
 from shared import *
+from text_engine import *
 
 
 #
 # Render pass that presents a countdown timer (coming from STDIN).
 #
 class TimerRenderPass(OutputRenderPass):
+    interactive = True
+
     def __init__(self):
         self.expire = None
 
     def name(self):
         return "Timer"
 
-    def render(self, img, events):
+    def update(self, img, events, ctx):
         line = non_block_stdin_get_line()
         if line is not None:
             seconds = int(line)
             self.expire = time.time() + seconds
 
+    def draw(self, img):
         if self.expire is not None:
             diff = self.expire - time.time()
             if diff >= 0:
@@ -27,16 +31,15 @@ class TimerRenderPass(OutputRenderPass):
             else:
                 text = "Timer completed"
 
-            img = cv2.flip(img, 1)
-            cv2.putText(
+            draw_text(
                 img,
                 text,
                 (OUT_WIDTH - 300, 100),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                COLOR_ORANGE,
-                2,
+                color=COLOR_ORANGE,
+                thickness=2,
+                mirrored=True,
+                # Changes every frame.
+                cache=False,
             )
-            img = cv2.flip(img, 1)
 
         return img
@@ -2,20 +2,30 @@ import cv2
 
 from conf import *
 from shared import *
+from text_engine import *
 
 
 #
 # Render pass that receives real time text input from STDIN.
-# Use `/clear` to reset.
+# Use `/clear` to reset. Scroll keys (up, down) page through older lines.
 #
 class TypingTextRenderPass(OutputRenderPass):
-    def __init__(self):
-        self.texts = []
+    interactive = True
+
+    def __init__(self, scroll_keys=(ord("["), ord("]"))):
+        self.x = 8
+        self.y = 25
+        self.line_height = 30
+        # Rows fitting on the frame.
+        self.rows = (OUT_HEIGHT - self.y) // self.line_height + 1
+
+        self.texts = TextBuffer(wrap_width=OUT_WIDTH - (self.x << 1))
+        self.scroll_keys = scroll_keys
 
     def name(self):
         return "STDIN typing"
 
-    def render(self, img, events):
+    def update(self, img, events, ctx):
         line = non_block_stdin_get_line()
         if line is not None:
             if line == "/clear":
@@ -23,28 +33,25 @@ class TypingTextRenderPass(OutputRenderPass):
             else:
                 self.texts.append(line)
 
-        img = cv2.flip(img, 1)
+        if self.scroll_keys is not None:
+            for event in events.keys:
+                if event.key_code == self.scroll_keys[0]:
+                    self.texts.scroll_by(TEXT_SCROLL_STEP)
+                elif event.key_code == self.scroll_keys[1]:
+                    self.texts.scroll_by(-TEXT_SCROLL_STEP)
 
-        for i, text in enumerate(self.texts):
-            cv2.putText(
-                img,
-                text,
-                (8, 25 + (i * 30)),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                COLOR_BLACK,
-                4,
-                cv2.LINE_AA,
-            )
-            cv2.putText(
+    def draw(self, img):
+        for i, text in enumerate(self.texts.visible_rows(self.rows)):
+            draw_text(
                 img,
                 text,
-                (8, 25 + (i * 30)),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                COLOR_WHITE,
-                2,
-                cv2.LINE_AA,
+                (self.x, self.y + (i * self.line_height)),
+                color=COLOR_WHITE,
+                thickness=2,
+                outline_color=COLOR_BLACK,
+                outline_thickness=4,
+                line_type=cv2.LINE_AA,
+                mirrored=True,
             )
 
-        return cv2.flip(img, 1)
+        return img
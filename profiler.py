@@ -0,0 +1,26 @@
+import logging
+import time
+
+
+#
+# Collects named timing marks (eg startup milestones), relative to app start. Only the first occurrence of a
+# mark is kept, each is logged as it happens.
+#
+class Profiler:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.marks = {}
+
+    def mark(self, name):
+        if name in self.marks:
+            return
+
+        elapsed = time.monotonic() - self.start
+        self.marks[name] = elapsed
+        logging.info("Profiler: " + name + " after " + str(int(elapsed * 1000)) + "ms")
+
+    def report(self):
+        return dict(self.marks)
+
+
+profiler = Profiler()
@@ -1,22 +1,130 @@
 import cv2
 import sys
+import os
 import select
+import tempfile
+import collections
+import threading
+import logging
+import numpy
 
 from conf import *
+from frame_context import *
+from profiler import *
+from memory_budget import *
 
 
 #
-# Event record for app level UI events.
+# Event record for app level UI events. Consecutive mouse moves are coalesced into a single event, where
+# `mouse_stroke` keeps every position in order (`mouse_pos` is the last one).
 #
 class Event:
-    def __init__(self, mouse_pos=None, mouse_click=None, key_code=None):
+    __slots__ = ("mouse_pos", "mouse_click", "key_code", "mouse_stroke")
+
+    def __init__(
+        self, mouse_pos=None, mouse_click=None, key_code=None, mouse_stroke=None
+    ):
         self.mouse_pos = mouse_pos
         self.mouse_click = mouse_click
         self.key_code = key_code
+        self.mouse_stroke = mouse_stroke
+
+    def kind(self):
+        if self.key_code is not None:
+            return EVENT_KIND_KEY
+        elif self.mouse_click is not None:
+            return EVENT_KIND_MOUSE_CLICK
+        else:
+            return EVENT_KIND_MOUSE_MOVE
+
+
+#
+# Events of a single frame, pre-indexed by kind so passes only iterate what they care about. Iterating the
+# object itself yields all events in arrival order.
+#
+class FrameEvents:
+    __slots__ = ("all", "keys", "clicks", "moves", "mouse")
+
+    def __init__(self, events=()):
+        self.all = list(events)
+        self.keys = []
+        self.clicks = []
+        self.moves = []
+        # Clicks and moves interleaved in arrival order (eg for drawing strokes).
+        self.mouse = []
+
+        for event in self.all:
+            kind = event.kind()
+            if kind == EVENT_KIND_KEY:
+                self.keys.append(event)
+            elif kind == EVENT_KIND_MOUSE_CLICK:
+                self.clicks.append(event)
+                self.mouse.append(event)
+            else:
+                self.moves.append(event)
+                self.mouse.append(event)
+
+    def __iter__(self):
+        return iter(self.all)
+
+    def __len__(self):
+        return len(self.all)
 
 
 #
-# Drawing interface for dot level painting (each input is a single coordinate).
+# Event bus between the UI thread (producer) and the render loop (consumer). Producers append to a deque
+# (atomic, no lock), the render loop swaps out everything that arrived since the previous frame in one go.
+#
+class EventBus:
+    def __init__(self):
+        self.incoming = collections.deque()
+
+    def push(self, event):
+        self.incoming.append(event)
+
+    def swap(self):
+        events = []
+        last_move = None
+
+        # Only take what is already there, a busy producer cannot hold up the frame.
+        for _ in range(len(self.incoming)):
+            event = self.incoming.popleft()
+
+            if event.kind() == EVENT_KIND_MOUSE_MOVE:
+                if last_move is not None:
+                    last_move.mouse_pos = event.mouse_pos
+                    last_move.mouse_stroke.append(event.mouse_pos)
+                    continue
+
+                event.mouse_stroke = [event.mouse_pos]
+                last_move = event
+            else:
+                last_move = None
+
+            events.append(event)
+
+        return FrameEvents(events)
+
+
+#
+# Single slot frame buffer for handing the latest frame to another thread without copying. The publisher
+# must not modify a frame after publishing it (the render loop creates a new frame every iteration).
+#
+class FrameSlot:
+    def __init__(self):
+        # Replaced as a whole, so readers always see a consistent (sequence, frame) pair.
+        self.latest = (-1, None)
+
+    def publish(self, img):
+        self.latest = (self.latest[0] + 1, img)
+
+    def get(self):
+        return self.latest
+
+
+#
+# Drawing interface for dot level painting (each input is a single coordinate). Drawers keep at most `max_points`
+# dots, when full the eviction policy either drops the oldest dot (EVICT_OLDEST) or starts over (EVICT_RESET).
 #
 class DotDrawer:
     def record(self, x, y):
@@ -28,54 +136,86 @@ class DotDrawer:
     def reset(self):
         NotImplementedError("Must be implemented")
 
+    def retained_bytes(self):
+        return estimate_attribute_bytes(self)
+
 
 #
 # Dot drawer that only draws dots as they were registered.
 #
 class SimpleDotDrawer(DotDrawer):
-    def __init__(self, color=COLOR_RED):
-        self.reset()
+    def __init__(
+        self,
+        color=COLOR_RED,
+        line_type=cv2.LINE_8,
+        max_points=DOT_DRAWER_MAX_POINTS,
+        eviction=DOT_DRAWER_EVICTION,
+    ):
+        # Insertion ordered set of the dots.
+        self.dots = collections.OrderedDict()
         self.color = color
+        self.line_type = line_type
+        self.max_points = max_points
+        self.eviction = eviction
 
     def record(self, x, y):
         if x == DISCONTINUATION_DOT or y == DISCONTINUATION_DOT:
             return
 
-        self.map[(OUT_WIDTH * y) + x] = 1
+        if (x, y) in self.dots:
+            return
+
+        if len(self.dots) >= self.max_points:
+            if self.eviction == EVICT_RESET:
+                self.reset()
+            else:
+                self.dots.popitem(last=False)
+
+        self.dots[(x, y)] = True
 
     def draw(self, img):
-        for y in range(OUT_HEIGHT):
-            for x in range(OUT_WIDTH):
-                if self.map[(y * OUT_WIDTH) + x] > 0:
-                    cv2.circle(img, (x, y), 4, self.color, -1)
+        for dot in self.dots:
+            cv2.circle(img, dot, 4, self.color, -1, self.line_type)
 
     def reset(self):
-        self.map = [0] * (OUT_HEIGHT * OUT_WIDTH)
+        self.dots.clear()
 
 
 #
 # Dot drawer that draws lines using the received sequence of dots.
 #
 class LineDrawer(DotDrawer):
-    def __init__(self, color=COLOR_RED):
-        self.sequence = []
+    def __init__(
+        self,
+        color=COLOR_RED,
+        max_points=DOT_DRAWER_MAX_POINTS,
+        eviction=DOT_DRAWER_EVICTION,
+    ):
+        self.sequence = collections.deque(
+            maxlen=max_points if eviction == EVICT_OLDEST else None
+        )
         self.color = color
+        self.max_points = max_points
+        self.eviction = eviction
 
     def record(self, x, y):
+        # Oldest dots are dropped by the deque itself.
+        if self.eviction == EVICT_RESET and len(self.sequence) >= self.max_points:
+            self.reset()
+
         self.sequence.append((x, y))
 
     def draw(self, img):
-        if len(self.sequence) == 0:
-            return
-
-        for i in range(len(self.sequence) - 1):
+        previous = None
+        for dot in self.sequence:
             if (
-                DISCONTINUATION_DOT in self.sequence[i]
-                or DISCONTINUATION_DOT in self.sequence[i + 1]
+                previous is not None
+                and DISCONTINUATION_DOT not in previous
+                and DISCONTINUATION_DOT not in dot
             ):
-                continue
+                cv2.line(img, previous, dot, self.color, 4)
 
-            cv2.line(img, self.sequence[i], self.sequence[i + 1], self.color, 4)
+            previous = dot
 
     def reset(self):
         self.sequence.clear()
@@ -86,12 +226,162 @@ class LineDrawer(DotDrawer):
 # (eventually) to the output video stream. Events are coming from the apps main event collector window
 # (mouse and key).
 #
+# Work is split in two: `update` does the analysis and state changes once per frame (on the clean input frame,
+# which it must not modify), `draw` paints the current state onto an output frame - once for every output that
+# has the pass enabled.
+#
+# The frame context (`FrameContext`) gives access to shared derived images of the frame (gray, HSV, ...) and to
+# the frame clock (`ctx.clock`, for time based animation). For scheduling (see `PassGraph`) a pass declares the
+# derived images it reads (`requires`) and whether its update can run concurrently with others (`parallel`).
+#
+# Passes report the memory they retain (`retained_bytes`) for the memory accounting, by default the estimated
+# size of their attributes. State growing over time must be bounded.
+#
+# Attributes listed in `tunables` can be changed at runtime through the control API (see `ControlServer`). Changes
+# are applied between frames, passes read them on every update / draw.
+#
+# Interactive passes (reading STDIN, running shell commands) are left out of offline runs by default.
+#
 class OutputRenderPass:
+    requires = ()
+    parallel = False
+    tunables = ()
+    interactive = False
+
+    # Context of stand-alone `render` calls, kept for the clock and buffers.
+    render_ctx = None
+
     def name(self):
         NotImplementedError("Must be implemented")
 
-    def render(self, img, events):
-        NotImplementedError("Must be implemented")
+    def update(self, img, events, ctx):
+        pass
+
+    def draw(self, img):
+        return img
+
+    def retained_bytes(self):
+        return estimate_attribute_bytes(self)
+
+    # Blocks until the background resources of the pass are loaded (eg for offline processing).
+    def wait_resources(self):
+        for value in vars(self).values():
+            if isinstance(value, BackgroundResource):
+                value.wait()
+
+    def render(self, img, events, ctx=None):
+        if ctx is None:
+            if self.render_ctx is None:
+                self.render_ctx = FrameContext()
+
+            self.render_ctx.reset(img)
+            ctx = self.render_ctx
+
+        self.update(img, events, ctx)
+        return self.draw(img)
+
+    # Analysis of a batch of frames ahead of their updates (offline processing), for passes that can evaluate
+    # multiple frames at once (eg a neural net). Results go into the frames' contexts, the pass state must not
+    # change: frames are still updated and drawn one by one.
+    def analyze_batch(self, frames, contexts):
+        pass
+
+    # Batch version of `render`. Without contexts each frame gets a new one (no time passes between them).
+    def render_batch(self, frames, events_per_frame, contexts=None):
+        if contexts is None:
+            contexts = [FrameContext(img) for img in frames]
+
+        self.analyze_batch(frames, contexts)
+        return [
+            self.render(img, events, ctx)
+            for img, events, ctx in zip(frames, events_per_frame, contexts)
+        ]
+
+
+#
+# Resource (model, device, ...) loaded in a background thread, so startup doesn't wait for it. Until it's loaded
+# `get` returns None, users are expected to skip their work meanwhile.
+#
+class BackgroundResource:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.failed = False
+        self.ready = threading.Event()
+        threading.Thread(target=self.load, daemon=True).start()
+
+    def load(self):
+        try:
+            self.value = self.loader()
+            profiler.mark(self.name + " loaded")
+        except Exception:
+            logging.exception("Failed loading " + self.name)
+            self.failed = True
+
+        self.ready.set()
+
+    def get(self):
+        return self.value
+
+    def retained_bytes(self):
+        return estimate_bytes(self.value)
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
+
+
+#
+# Grayscale image loader with a decoded copy cached on disk (numpy format, no decoding on the next start).
+# The cache entry is keyed by the source file's modification time and size.
+#
+def load_grayscale_cached(path):
+    stat = os.stat(path)
+    cache_path = os.path.join(
+        CACHE_DIR,
+        os.path.basename(path)
+        + "."
+        + str(stat.st_mtime_ns)
+        + "-"
+        + str(stat.st_size)
+        + ".npy",
+    )
+
+    if os.path.exists(cache_path):
+        try:
+            return numpy.load(cache_path)
+        except Exception:
+            # Eg a truncated entry.
+            logging.warning("Invalid cache entry, decoding again: " + cache_path)
+
+    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise IOError("Cannot read image: " + path)
+
+    # Written aside and moved into place, so an interrupted (or concurrent) write never leaves a partial entry.
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix=".tmp", delete=False) as f:
+        numpy.save(f, img)
+    os.replace(f.name, cache_path)
+
+    return img
+
+
+#
+# Environment config collecting all env and command line args used in the app.
+#
+class EnvConfig:
+    def __init__(self):
+        self.raw_args = sys.argv
+        self.value_args = {}
+        self.flags = []
+
+        for raw_arg in self.raw_args:
+            if raw_arg.find("=") > 0:
+                parts = raw_arg.split("=")
+                self.value_args[parts[0]] = parts[1]
+            else:
+                self.flags.append(raw_arg)
 
 
 def non_block_stdin_get_line():
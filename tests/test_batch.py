@@ -0,0 +1,56 @@
+import unittest
+import numpy
+
+from conf import *
+from shared import *
+from offline import OfflineRunner
+from plugins.pong import PongRenderPass
+
+
+class FrameCollector:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, img):
+        self.frames.append(img.copy())
+
+
+def timed_batch(count, fps=30):
+    frames = numpy.zeros((count, OUT_HEIGHT, OUT_WIDTH, 3), numpy.uint8)
+    contexts = [FrameContext() for _ in range(count)]
+    for i, ctx in enumerate(contexts):
+        ctx.reset(frames[i], now=i / fps, dt=1.0 / fps)
+
+    return frames, contexts
+
+
+class BatchTest(unittest.TestCase):
+    def assertFramesDiffer(self, frames):
+        for i in range(1, len(frames)):
+            self.assertFalse(
+                numpy.array_equal(frames[i - 1], frames[i]),
+                "frames " + str(i - 1) + " and " + str(i) + " are the same",
+            )
+
+    def test_render_batch_draws_each_frame_state(self):
+        frames, contexts = timed_batch(4)
+
+        rendered = PongRenderPass().render_batch(
+            frames, [FrameEvents() for _ in frames], contexts
+        )
+
+        self.assertFramesDiffer(rendered)
+
+    def test_offline_runner_draws_each_frame_state(self):
+        frames, contexts = timed_batch(4)
+        writer = FrameCollector()
+
+        runner = OfflineRunner([PongRenderPass()], 1, len(frames))
+        runner.process(frames, [FrameEvents() for _ in frames], contexts, writer)
+
+        self.assertEqual(len(writer.frames), len(frames))
+        self.assertFramesDiffer(writer.frames)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,334 @@
+import collections
+import cv2
+import numpy
+
+from conf import *
+from memory_budget import *
+
+
+#
+# Rasterized text line, ready to be blended onto a frame. Colors are premultiplied with the coverage (alpha) so
+# blending is a single multiply-add: out = pixels + frame * inverse_alpha / 255.
+#
+class TextSprite:
+    __slots__ = ("pixels", "inverse_alpha", "anchor_x", "anchor_y")
+
+    def __init__(self, pixels, inverse_alpha, anchor_x, anchor_y):
+        self.pixels = pixels
+        self.inverse_alpha = inverse_alpha
+        # Offset of the text origin (bottom left, as in `cv2.putText`) inside the sprite.
+        self.anchor_x = anchor_x
+        self.anchor_y = anchor_y
+
+    def width(self):
+        return self.pixels.shape[1]
+
+    def height(self):
+        return self.pixels.shape[0]
+
+    def nbytes(self):
+        return self.pixels.nbytes + self.inverse_alpha.nbytes
+
+
+#
+# Text renderer that rasterizes each distinct line once and blits it afterwards. Sprites are cached by content and
+# style, least recently used ones are evicted when the cache grows over `max_bytes`. Text changing every frame
+# (eg a running clock) is better drawn without caching.
+#
+class TextEngine:
+    def __init__(self, max_bytes=TEXT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.cache = collections.OrderedDict()
+        # Total size of the cached sprites.
+        self.size = 0
+
+    def sprite(
+        self,
+        text,
+        scale,
+        color,
+        thickness,
+        outline_color,
+        outline_thickness,
+        font,
+        line_type,
+        mirrored,
+        cache=True,
+    ):
+        key = (
+            text,
+            scale,
+            color,
+            thickness,
+            outline_color,
+            outline_thickness,
+            font,
+            line_type,
+            mirrored,
+        )
+
+        sprite = self.cache.get(key)
+        if sprite is not None:
+            self.cache.move_to_end(key)
+            return sprite
+
+        sprite = self.rasterize(*key)
+        if not cache:
+            return sprite
+
+        self.cache[key] = sprite
+        self.size += sprite.nbytes()
+        while self.size > self.max_bytes and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.size -= evicted.nbytes()
+
+        return sprite
+
+    def retained_bytes(self):
+        return self.size
+
+    def rasterize(
+        self,
+        text,
+        scale,
+        color,
+        thickness,
+        outline_color,
+        outline_thickness,
+        font,
+        line_type,
+        mirrored,
+    ):
+        has_outline = outline_color is not None and outline_thickness > thickness
+        stroke = outline_thickness if has_outline else thickness
+
+        (text_width, text_height), baseline = cv2.getTextSize(text, font, scale, stroke)
+        pad = stroke
+        width = text_width + (pad << 1)
+        height = text_height + baseline + (pad << 1)
+        origin = (pad, pad + text_height)
+
+        # Coverage of the outermost stroke.
+        alpha = numpy.zeros((height, width), numpy.uint8)
+        cv2.putText(alpha, text, origin, font, scale, 255, stroke, line_type)
+
+        # Solid background in the outer color, so antialiased edges blend with the right color.
+        pixels = numpy.empty((height, width, 3), numpy.uint8)
+        pixels[:] = outline_color if has_outline else color
+        if has_outline:
+            cv2.putText(pixels, text, origin, font, scale, color, thickness, line_type)
+
+        if mirrored:
+            alpha = numpy.ascontiguousarray(alpha[:, ::-1])
+            pixels = numpy.ascontiguousarray(pixels[:, ::-1])
+
+        alpha = alpha[:, :, None]
+        pixels = ((pixels * alpha.astype(numpy.uint16) + 127) // 255).astype(
+            numpy.uint8
+        )
+
+        return TextSprite(pixels, 255 - alpha, pad, pad + text_height)
+
+    def blit(self, img, sprite, x, y):
+        img_height, img_width = img.shape[:2]
+
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + sprite.width(), img_width)
+        y1 = min(y + sprite.height(), img_height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        pixels = sprite.pixels[(y0 - y) : (y1 - y), (x0 - x) : (x1 - x)]
+        inverse_alpha = sprite.inverse_alpha[(y0 - y) : (y1 - y), (x0 - x) : (x1 - x)]
+
+        roi = img[y0:y1, x0:x1]
+        # Widened for the multiplication, the sprite keeps it in 8 bits.
+        inverse_alpha = inverse_alpha.astype(numpy.uint16)
+        roi[:] = pixels + ((roi * inverse_alpha + 127) // 255).astype(numpy.uint8)
+
+    #
+    # Same as `cv2.putText` (with an optional outline drawn under the text). In mirrored mode the position is
+    # understood on the horizontally flipped frame - the way the passes write readable text onto the (mirrored)
+    # video - without flipping the whole frame.
+    #
+    def draw(
+        self,
+        img,
+        text,
+        org,
+        scale=1,
+        color=COLOR_WHITE,
+        thickness=2,
+        outline_color=None,
+        outline_thickness=0,
+        font=cv2.FONT_HERSHEY_SIMPLEX,
+        line_type=cv2.LINE_8,
+        mirrored=False,
+        cache=True,
+    ):
+        if len(text) == 0:
+            return img
+
+        sprite = self.sprite(
+            text,
+            scale,
+            color,
+            thickness,
+            outline_color,
+            outline_thickness,
+            font,
+            line_type,
+            mirrored,
+            cache,
+        )
+
+        x = org[0] - sprite.anchor_x
+        y = org[1] - sprite.anchor_y
+        if mirrored:
+            x = img.shape[1] - x - sprite.width()
+
+        self.blit(img, sprite, x, y)
+
+        return img
+
+
+#
+# Bounded text history for the text passes. Lines beyond `max_lines` fall off (oldest first). Each line is
+# wrapped to `wrap_width` pixels once, when it's added. Rendering goes through `visible_rows`, which only returns
+# the rows fitting the viewport, `scroll` rows up from the newest one. Anchored at the top (eg command output, read
+# from the start) the viewport is `scroll` rows down from the first row instead.
+#
+class TextBuffer:
+    def __init__(
+        self,
+        max_lines=TEXT_BUFFER_MAX_LINES,
+        wrap_width=OUT_WIDTH,
+        scale=1,
+        thickness=2,
+        font=cv2.FONT_HERSHEY_SIMPLEX,
+        anchor_top=False,
+    ):
+        self.wrap_width = wrap_width
+        self.scale = scale
+        self.thickness = thickness
+        self.font = font
+        self.anchor_top = anchor_top
+
+        # Entries are (line, wrapped rows) pairs.
+        self.lines = collections.deque(maxlen=max_lines)
+        self.row_count = 0
+        self.scroll = 0
+
+    def append(self, line):
+        self.append_wrapped(line, self.wrap(line))
+
+    def append_wrapped(self, line, rows):
+        if len(self.lines) == self.lines.maxlen:
+            self.row_count -= len(self.lines[0][1])
+
+        self.lines.append((line, rows))
+        self.row_count += len(rows)
+
+        # Keep the viewport on the same rows when scrolled back.
+        if self.scroll > 0 and not self.anchor_top:
+            self.scroll += len(rows)
+
+    # Replaces all lines, reusing the wrapping of the ones already present (eg repeated command output). The scroll
+    # position is kept, as far as the new rows reach.
+    def set_lines(self, lines):
+        known_rows = dict(self.lines)
+        scroll = self.scroll
+
+        # Anchored at the top the first lines are kept.
+        if self.anchor_top:
+            lines = lines[: self.lines.maxlen]
+
+        self.clear()
+        for line in lines:
+            rows = known_rows.get(line)
+            self.append_wrapped(line, rows if rows is not None else self.wrap(line))
+
+        self.scroll = min(scroll, max(0, self.row_count - 1))
+
+    def clear(self):
+        self.lines.clear()
+        self.row_count = 0
+        self.scroll = 0
+
+    def retained_bytes(self):
+        return estimate_bytes(self.lines)
+
+    # Positive rows scroll up (towards the first row), negative ones down.
+    def scroll_by(self, rows):
+        if self.anchor_top:
+            rows = -rows
+
+        self.scroll = max(0, min(self.scroll + rows, self.row_count - 1))
+
+    def visible_rows(self, max_rows):
+        self.scroll = min(self.scroll, max(0, self.row_count - max_rows))
+        skip = self.scroll
+        rows = []
+
+        if self.anchor_top:
+            for _, line_rows in self.lines:
+                for row in line_rows:
+                    if skip > 0:
+                        skip -= 1
+                    elif len(rows) < max_rows:
+                        rows.append(row)
+                    else:
+                        return rows
+
+            return rows
+
+        # Walk back from the newest line, only as far as the viewport reaches.
+        for _, line_rows in reversed(self.lines):
+            for row in reversed(line_rows):
+                if skip > 0:
+                    skip -= 1
+                elif len(rows) < max_rows:
+                    rows.append(row)
+                else:
+                    return rows[::-1]
+
+        return rows[::-1]
+
+    def text_width(self, text):
+        return cv2.getTextSize(text, self.font, self.scale, self.thickness)[0][0]
+
+    def wrap(self, line):
+        if self.text_width(line) <= self.wrap_width:
+            return (line,)
+
+        rows = []
+        row = ""
+        for word in line.split(" "):
+            candidate = word if len(row) == 0 else row + " " + word
+            if self.text_width(candidate) <= self.wrap_width:
+                row = candidate
+                continue
+
+            if len(row) > 0:
+                rows.append(row)
+
+            # Words wider than the viewport are broken up.
+            row = ""
+            for c in word:
+                if len(row) > 0 and self.text_width(row + c) > self.wrap_width:
+                    rows.append(row)
+                    row = ""
+                row += c
+
+        rows.append(row)
+
+        return tuple(rows)
+
+
+# Shared by all passes (drawing happens on the render thread only).
+text_engine = TextEngine()
+
+
+def draw_text(img, text, org, **kwargs):
+    return text_engine.draw(img, text, org, **kwargs)